@@ -0,0 +1,381 @@
+"""
+Chunked multithreaded execution
+===============================
+
+Row-wise NumPy kernels and reductions split in contiguous blocks that run
+in a shared thread pool. NumPy releases the GIL on large arrays, so the
+blocks run concurrently on the same memory. Each block writes its own
+slice of the outputs and partial sums are added in block order, so the
+results do not depend on the number of threads.
+
+The number of threads and the minimum block size are read from
+`eptm.settings['n_threads']` and `eptm.settings['min_chunk_size']`.
+The blocked geometry updates below are used by
+:class:`CellPacking.dynamics.ChunkedShearMonolayerGeometry`.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from tyssue.dynamics.factory import model_factory
+
+# Below this number of rows per block, thread dispatch costs more than it saves
+MIN_CHUNK_SIZE = 4096
+
+_executors = {}
+# A forked child inherits the executors but not their threads,
+# it must start its own
+os.register_at_fork(after_in_child=_executors.clear)
+
+
+def _get_executor(n_threads):
+    if n_threads not in _executors:
+        _executors[n_threads] = ThreadPoolExecutor(max_workers=n_threads)
+    return _executors[n_threads]
+
+
+def get_n_threads(eptm):
+    """Number of threads requested through `eptm.settings['n_threads']`
+    (1 by default, i.e. serial execution).
+    """
+    return int(eptm.settings.get("n_threads", 1))
+
+
+def chunk_options(eptm):
+    """Keyword arguments of :func:`chunked_apply` and :func:`chunked_sum`
+    read from `eptm.settings`: `n_threads` (1 by default) and
+    `min_chunk_size` (MIN_CHUNK_SIZE by default).
+    """
+    return {
+        "n_threads": get_n_threads(eptm),
+        "min_chunk_size": int(eptm.settings.get("min_chunk_size", MIN_CHUNK_SIZE)),
+    }
+
+
+def _block_bounds(n_rows, n_threads, min_chunk_size):
+    n_blocks = max(min(n_threads, n_rows // min_chunk_size), 1)
+    return np.linspace(0, n_rows, n_blocks + 1).astype(int)
+
+
+def _map_blocks(func, bounds, n_threads):
+    """Calls `func(start, stop)` on each block, in the thread pool
+    if there is more than one block, and returns the results in block order.
+    """
+    if bounds.shape[0] == 2:
+        return [func(bounds[0], bounds[1])]
+    executor = _get_executor(n_threads)
+    futures = [
+        executor.submit(func, start, stop) for start, stop in zip(bounds[:-1], bounds[1:])
+    ]
+    # raises the block exception if any
+    return [future.result() for future in futures]
+
+
+def chunked_apply(kernel, inputs, outputs, n_threads=1, min_chunk_size=MIN_CHUNK_SIZE,
+                  shared=()):
+    """Applies `kernel` block-wise along the first axis of its arguments.
+
+    The rows are split in at most `n_threads` contiguous blocks and each
+    block is computed in a shared thread pool. NumPy ufuncs and fancy
+    indexing release the GIL on large arrays, so blocks run concurrently
+    without copying the data to other processes. Each block writes into
+    its own slice of the `outputs`, so the result is identical to the
+    serial one whatever the scheduling.
+
+    Parameters
+    ----------
+    kernel : function
+        called as `kernel(*shared, *inputs, *outputs)` on each block,
+        must write its results in place in the outputs
+    inputs : sequence of arrays or scalars
+        scalars are passed as is to every block
+    outputs : sequence of arrays
+        preallocated arrays with the same first dimension
+    n_threads : int, default 1
+    min_chunk_size : int
+        minimum number of rows per block
+    shared : sequence of arrays
+        passed whole to every block, e.g. the vertex positions
+        gathered on the edges
+
+    Returns
+    -------
+    outputs
+    """
+
+    def apply_block(start, stop):
+        block = slice(start, stop)
+        kernel(
+            *shared,
+            *[arr[block] if np.ndim(arr) else arr for arr in inputs],
+            *[arr[block] for arr in outputs],
+        )
+
+    _map_blocks(apply_block, _block_bounds(outputs[0].shape[0], n_threads, min_chunk_size),
+                n_threads)
+    return outputs
+
+
+def chunked_sum(index, values, size, n_threads=1, min_chunk_size=MIN_CHUNK_SIZE):
+    """Sums the rows of `values` sharing the same `index`, the NumPy
+    equivalent of `groupby(index).sum()` for positional indices.
+
+    Each block of rows is reduced with `np.bincount` (which releases the
+    GIL) into a partial sum over all the groups, and the partial sums are
+    added in block order, so the result does not depend on the scheduling.
+    As in pandas, NaN values are skipped.
+
+    Parameters
+    ----------
+    index : (N,) int array
+        group of each row, between 0 and `size` - 1
+    values : (N,) or (N, M) float array
+    size : int
+        number of groups
+    n_threads : int, default 1
+    min_chunk_size : int
+        minimum number of rows per block
+
+    Returns
+    -------
+    summed : (size,) or (size, M) array
+    """
+    values = np.asarray(values, dtype=float)
+
+    def block_sum(start, stop):
+        idx = index[start:stop]
+        block = values[start:stop]
+        block = np.where(np.isnan(block), 0.0, block)
+        if values.ndim == 1:
+            return np.bincount(idx, block, minlength=size)
+        return np.column_stack(
+            [np.bincount(idx, block[:, k], minlength=size) for k in range(values.shape[1])]
+        )
+
+    partials = _map_blocks(
+        block_sum, _block_bounds(index.shape[0], n_threads, min_chunk_size), n_threads
+    )
+    summed = partials[0]
+    for partial in partials[1:]:
+        summed += partial
+    return summed
+
+
+def set_columns(df, columns, values):
+    """Writes `values` (one column per name in `columns`) in `df`.
+
+    Existing float columns are written in place, which avoids pandas
+    copying all the columns of the same block when one is replaced.
+    """
+    values = np.asarray(values).reshape(df.shape[0], len(columns))
+    for i, column in enumerate(columns):
+        if column in df.columns and df.dtypes[column] == float:
+            df.loc[:, column] = values[:, i]
+        else:
+            df[column] = values[:, i]
+
+
+def chunked_model_factory(effectors, ref_effector=None):
+    """Same as tyssue's `model_factory`, except that the edge gradients are
+    summed on the vertices by :func:`chunked_sum` instead of a pandas groupby.
+
+    The number of threads and the block size are read from the epithelium
+    settings, see :func:`chunk_options`.
+    """
+    Model = model_factory(effectors, ref_effector)
+
+    class ChunkedModel(Model):
+        @staticmethod
+        def compute_gradient(eptm, components=False):
+            norm_factor = eptm.specs["settings"].get("nrj_norm_factor", 1)
+            grads = [f.gradient(eptm) for f in effectors]
+            if components:
+                return grads
+
+            # Same selection of the effector outputs as tyssue's model
+            srce_grads = [g[0].to_numpy() for g in grads if g[0].shape[0] == eptm.Ne]
+            trgt_grads = [
+                g[1].to_numpy()
+                for g in grads
+                if (g[1] is not None) and (g[1].shape[0] == eptm.Ne)
+            ]
+            vert_grads = [g[0].to_numpy() for g in grads if g[0].shape[0] == eptm.Nv]
+
+            index, values = [], []
+            if srce_grads:
+                index.append(eptm.edge_df["srce"].to_numpy(dtype=int))
+                values.append(sum(srce_grads))
+            if trgt_grads:
+                index.append(eptm.edge_df["trgt"].to_numpy(dtype=int))
+                values.append(sum(trgt_grads))
+            grad_i = np.zeros((eptm.Nv, eptm.dim))
+            if index:
+                grad_i += chunked_sum(np.concatenate(index), np.concatenate(values),
+                                      eptm.Nv, **chunk_options(eptm))
+            for grad in vert_grads:
+                grad_i += grad
+
+            return pd.DataFrame(
+                grad_i / norm_factor,
+                index=eptm.vert_df.index,
+                columns=["g" + u for u in eptm.coords],
+            )
+
+    return ChunkedModel
+
+
+def _dcoords_kernel(pos, srce, trgt, srce_pos, trgt_pos, dpos):
+    srce_pos[:] = pos[srce]
+    trgt_pos[:] = pos[trgt]
+    np.subtract(trgt_pos, srce_pos, out=dpos)
+
+
+def _wrap_kernel(period, d, shift):
+    half = period / 2
+    shift[:] = period * ((d < -half).astype(float) - (d >= half))
+    d += shift
+
+
+def _length_kernel(dpos, length):
+    length[:] = np.linalg.norm(dpos, axis=1)
+
+
+def _ucoords_kernel(dpos, length, upos):
+    np.divide(dpos, length[:, np.newaxis], out=upos)
+
+
+def _centroid_kernel(face_pos, cell_pos, face, cell, srce_pos, fpos, rpos, cpos):
+    fpos[:] = face_pos[face]
+    np.subtract(srce_pos, fpos, out=rpos)
+    cpos[:] = cell_pos[cell]
+
+
+def _normals_kernel(rpos, dpos, normals):
+    normals[:] = np.cross(rpos, dpos)
+
+
+def _sub_area_kernel(normals, sub_area):
+    sub_area[:] = np.linalg.norm(normals, axis=1) / 2
+
+
+def update_dcoords(eptm):
+    """Updates the source, target and edge vector coordinates as tyssue's
+    `update_dcoords`, including the periodic boundary conditions, with
+    the vertex positions gathered on the edges block-wise.
+    """
+    options = chunk_options(eptm)
+    boundaries = eptm.settings.get("boundaries")
+    if boundaries is not None:
+        for u, (low, high) in boundaries.items():
+            pos = eptm.vert_df[u].to_numpy(dtype=float)
+            eptm.vert_df[u] = pos + (high - low) * ((pos <= low).astype(float) - (pos > high))
+
+    srce = eptm.edge_df["srce"].to_numpy(dtype=int)
+    trgt = eptm.edge_df["trgt"].to_numpy(dtype=int)
+    srce_pos = np.empty((eptm.Ne, eptm.dim))
+    trgt_pos = np.empty((eptm.Ne, eptm.dim))
+    dpos = np.empty((eptm.Ne, eptm.dim))
+    chunked_apply(_dcoords_kernel, (srce, trgt), (srce_pos, trgt_pos, dpos),
+                  shared=(eptm.vert_df[eptm.coords].to_numpy(dtype=float),), **options)
+
+    if boundaries is not None:
+        face = eptm.edge_df["face"].to_numpy(dtype=int)
+        for u, (low, high) in boundaries.items():
+            i = eptm.coords.index(u)
+            period = high - low
+            center = high - period / 2
+            shift = np.empty(eptm.Ne)
+            chunked_apply(_wrap_kernel, (period,), (dpos[:, i], shift), **options)
+            at_boundary = shift != 0
+            eptm.edge_df[f"at_{u}_boundary"] = at_boundary
+            face_at_boundary = chunked_sum(face, at_boundary, eptm.Nf, **options) > 0
+            eptm.face_df[f"at_{u}_boundary"] = face_at_boundary
+            edge_at_boundary = face_at_boundary[face]
+            for pos in (srce_pos[:, i], trgt_pos[:, i]):
+                pos += edge_at_boundary * (pos < center) * period
+
+    set_columns(eptm.edge_df, ["s" + u for u in eptm.coords], srce_pos)
+    set_columns(eptm.edge_df, ["t" + u for u in eptm.coords], trgt_pos)
+    set_columns(eptm.edge_df, eptm.dcoords, dpos)
+
+
+def update_ucoords(eptm):
+    """Updates the unit edge vectors from the `length` column."""
+    upos = np.empty((eptm.Ne, eptm.dim))
+    chunked_apply(_ucoords_kernel,
+                  (eptm.edge_df[eptm.dcoords].to_numpy(dtype=float),
+                   eptm.edge_df["length"].to_numpy(dtype=float)),
+                  (upos,), **chunk_options(eptm))
+    set_columns(eptm.edge_df, eptm.ucoords, upos)
+
+
+def update_length(eptm):
+    length = np.empty(eptm.Ne)
+    chunked_apply(_length_kernel, (eptm.edge_df[eptm.dcoords].to_numpy(dtype=float),),
+                  (length,), **chunk_options(eptm))
+    set_columns(eptm.edge_df, ["length"], length)
+
+
+def update_perimeters(eptm):
+    perimeter = chunked_sum(eptm.edge_df["face"].to_numpy(dtype=int),
+                            eptm.edge_df["length"].to_numpy(dtype=float),
+                            eptm.Nf, **chunk_options(eptm))
+    set_columns(eptm.face_df, ["perimeter"], perimeter)
+
+
+def update_bulk_centroid(eptm):
+    """Updates the face centroids weighted by the edge lengths, and the
+    cell centroids, as tyssue's `RNRGeometry.update_centroid`.
+    """
+    options = chunk_options(eptm)
+    face = eptm.edge_df["face"].to_numpy(dtype=int)
+    cell = eptm.edge_df["cell"].to_numpy(dtype=int)
+    srce_pos = eptm.edge_df[["s" + u for u in eptm.coords]].to_numpy(dtype=float)
+    trgt_pos = eptm.edge_df[["t" + u for u in eptm.coords]].to_numpy(dtype=float)
+    length = eptm.edge_df["length"].to_numpy(dtype=float)
+
+    mid_pos = (srce_pos + trgt_pos) / 2 * length[:, np.newaxis]
+    face_pos = chunked_sum(face, mid_pos, eptm.Nf, **options)
+    face_pos /= eptm.face_df["perimeter"].to_numpy(dtype=float)[:, np.newaxis]
+    set_columns(eptm.face_df, eptm.coords, face_pos)
+
+    cell_pos = chunked_sum(cell, srce_pos, eptm.Nc, **options)
+    cell_pos /= np.bincount(cell, minlength=eptm.Nc)[:, np.newaxis]
+    set_columns(eptm.cell_df, eptm.coords, cell_pos)
+
+    fpos = np.empty((eptm.Ne, eptm.dim))
+    rpos = np.empty((eptm.Ne, eptm.dim))
+    cpos = np.empty((eptm.Ne, eptm.dim))
+    chunked_apply(_centroid_kernel, (face, cell, srce_pos), (fpos, rpos, cpos),
+                  shared=(face_pos, cell_pos), **options)
+    set_columns(eptm.edge_df, ["f" + u for u in eptm.coords], fpos)
+    set_columns(eptm.edge_df, ["r" + u for u in eptm.coords], rpos)
+    set_columns(eptm.edge_df, ["c" + u for u in eptm.coords], cpos)
+
+
+def update_normals(eptm):
+    normals = np.empty((eptm.Ne, eptm.dim))
+    chunked_apply(_normals_kernel,
+                  (eptm.edge_df[["r" + u for u in eptm.coords]].to_numpy(dtype=float),
+                   eptm.edge_df[eptm.dcoords].to_numpy(dtype=float)),
+                  (normals,), **chunk_options(eptm))
+    set_columns(eptm.edge_df, eptm.ncoords, normals)
+
+
+def update_bulk_areas(eptm):
+    """Updates the edge sub-areas and the face and cell areas,
+    as tyssue's `BulkGeometry.update_areas`.
+    """
+    options = chunk_options(eptm)
+    sub_area = np.empty(eptm.Ne)
+    chunked_apply(_sub_area_kernel, (eptm.edge_df[eptm.ncoords].to_numpy(dtype=float),),
+                  (sub_area,), **options)
+    set_columns(eptm.edge_df, ["sub_area"], sub_area)
+    face_area = chunked_sum(eptm.edge_df["face"].to_numpy(dtype=int), sub_area,
+                            eptm.Nf, **options)
+    set_columns(eptm.face_df, ["area"], face_area)
+    cell_area = chunked_sum(eptm.edge_df["cell"].to_numpy(dtype=int), sub_area,
+                            eptm.Nc, **options)
+    set_columns(eptm.cell_df, ["area"], cell_area)
+
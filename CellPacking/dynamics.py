@@ -6,6 +6,63 @@ from tyssue.dynamics import effectors
 from tyssue.geometry.planar_geometry import PlanarGeometry
 from tyssue.geometry.bulk_geometry import MonolayerGeometry
 
+from .chunked import (chunk_options,
+                      chunked_apply,
+                      chunked_sum,
+                      set_columns,
+                      update_dcoords,
+                      update_ucoords,
+                      update_length,
+                      update_perimeters,
+                      update_bulk_centroid,
+                      update_normals,
+                      update_bulk_areas)
+
+
+def _line_tension_kernel(ucoords, gamma, is_active, grad):
+    tension = gamma * is_active
+    np.multiply(-ucoords, tension[:, np.newaxis], out=grad)
+
+
+def _barrier_kernel(coords, z_distance, barrier_elasticity, grad):
+    kl_l0 = barrier_elasticity * z_distance
+    np.multiply(coords, kl_l0[:, np.newaxis], out=grad)
+    grad[:, :2] = 0
+
+
+def _gamma_kernel(dx, dy, gamma_0, phi, angle, gamma):
+    np.arctan2(dy, dx, out=angle)
+    np.subtract(angle, phi, out=gamma)
+    np.multiply(gamma, 2, out=gamma)
+    np.cos(gamma, out=gamma)
+    np.multiply(gamma, gamma_0, out=gamma)
+
+
+def _zdistance_kernel(z, z_barrier, z_distance):
+    np.subtract(np.abs(z), np.abs(z_barrier), out=z_distance)
+    np.maximum(z_distance, 0, out=z_distance)
+
+
+def update_gamma_values(sheet, phi):
+    """Computes the edge angles and the anisotropic line tension
+    `gamma_0 * cos(2 * (angle - phi))` in the `angle` and `gamma` columns
+    """
+    angle = np.empty(sheet.Ne)
+    gamma = np.empty(sheet.Ne)
+    chunked_apply(
+        _gamma_kernel,
+        (
+            sheet.edge_df["dx"].to_numpy(dtype=float),
+            sheet.edge_df["dy"].to_numpy(dtype=float),
+            sheet.edge_df["gamma_0"].to_numpy(dtype=float),
+            phi,
+        ),
+        (angle, gamma),
+        **chunk_options(sheet),
+    )
+    set_columns(sheet.edge_df, ["angle", "gamma"], np.column_stack((angle, gamma)))
+
+
 
 class Compression(effectors.AbstractEffector):
 
@@ -48,10 +105,20 @@ class AnisotropicLineTension(effectors.AbstractEffector):
 
     @staticmethod
     def gradient(sheet):
-        grad_srce = -sheet.edge_df[sheet.ucoords] * to_nd(
-            sheet.edge_df.eval("gamma * is_active"), len(sheet.coords)
+        grad = np.empty((sheet.Ne, len(sheet.coords)))
+        chunked_apply(
+            _line_tension_kernel,
+            (
+                sheet.edge_df[sheet.ucoords].to_numpy(dtype=float),
+                sheet.edge_df["gamma"].to_numpy(dtype=float),
+                sheet.edge_df["is_active"].to_numpy(dtype=float),
+            ),
+            (grad,),
+            **chunk_options(sheet),
+        )
+        grad_srce = pd.DataFrame(
+            grad, index=sheet.edge_df.index, columns=["g" + u for u in sheet.coords]
         )
-        grad_srce.columns = ["g" + u for u in sheet.coords]
         grad_trgt = -grad_srce
         return grad_srce, grad_trgt
 
@@ -78,13 +145,20 @@ class PlaneBarrierElasticity(effectors.AbstractEffector):
 
     @staticmethod
     def gradient(eptm):
-        kl_l0 = elastic_force(eptm.vert_df, "z_distance", "barrier_elasticity", 0)
-        grad = eptm.vert_df[eptm.coords] * to_nd(kl_l0, eptm.dim)
-        grad.columns = ["g" + u for u in eptm.coords]
-        grad["gx"] = 0
-        grad["gy"] = 0
-        # if "z" in eptm.coords:
-        #     grad["gz"] = 0
+        grad = np.empty((eptm.Nv, eptm.dim))
+        chunked_apply(
+            _barrier_kernel,
+            (
+                eptm.vert_df[eptm.coords].to_numpy(dtype=float),
+                eptm.vert_df["z_distance"].to_numpy(dtype=float),
+                eptm.vert_df["barrier_elasticity"].to_numpy(dtype=float),
+            ),
+            (grad,),
+            **chunk_options(eptm),
+        )
+        grad = pd.DataFrame(
+            grad, index=eptm.vert_df.index, columns=["g" + u for u in eptm.coords]
+        )
         return grad, grad
 
 
@@ -116,6 +190,29 @@ class BarrierElasticity(effectors.AbstractEffector):
         return grad, grad
 
 
+def update_periodic_cells(eptm):
+    """Unwraps the source and target positions of the cells crossing
+    a periodic boundary.
+
+    tyssue unwraps positions face by face, so the lateral faces of a cell
+    crossing the boundary can lie on the other side of the box than its
+    apical and basal faces. Here all the vertices of such a cell below
+    the box center are moved by one period, so that the cell centroids
+    and volumes are computed on a single image of the cell.
+    """
+    cell = eptm.edge_df["cell"].to_numpy(dtype=int)
+    for u, boundary in eptm.settings["boundaries"].items():
+        period = boundary[1] - boundary[0]
+        center = boundary[1] - period / 2
+        cell_at_boundary = chunked_sum(cell, eptm.edge_df[f"at_{u}_boundary"].to_numpy(),
+                                       eptm.Nc, **chunk_options(eptm)) > 0
+        at_boundary = cell_at_boundary[cell]
+        vert_pos = eptm.vert_df[u].to_numpy(dtype=float)
+        for c in ("s", "t"):
+            pos = vert_pos[eptm.edge_df["srce" if c == "s" else "trgt"].to_numpy(dtype=int)]
+            set_columns(eptm.edge_df, [c + u], pos + at_boundary * (pos < center) * period)
+
+
 class ShearPlanarGeometry(PlanarGeometry):
     @classmethod
     def update_all(cls, sheet):
@@ -124,16 +221,17 @@ class ShearPlanarGeometry(PlanarGeometry):
 
     @staticmethod
     def update_gamma(cls, sheet):
-        gamma_0 = sheet.edge_df['gamma_0']
         if 'phi0' in sheet.specs['edge']:
             phi = sheet.specs['edge']['phi0']
         else:
             phi = sheet.specs['edge']['phi0_apical']
 
-        e_angle = cls.get_phis(sheet)
-        sheet.edge_df['angle'] = e_angle
+        if "dx" not in sheet.edge_df:
+            cls.update_dcoords(sheet)
+            cls.update_centroid(sheet)
+
+        update_gamma_values(sheet, phi)
         # sheet.edge_df["angle"] = [np.pi + a if a < 0 else a for a in e_angle]
-        sheet.edge_df["gamma"] = gamma_0 * np.cos(2 * (e_angle - phi))
         sheet.edge_df['line_tension'] = sheet.edge_df["gamma"]
 
     @classmethod
@@ -148,11 +246,17 @@ class ShearPlanarGeometry(PlanarGeometry):
 class ShearMonolayerGeometry(MonolayerGeometry):
     @classmethod
     def update_all(cls, sheet):
-        MonolayerGeometry.update_all(sheet)
+        super().update_all(sheet)
         cls.update_gamma(cls, sheet)
         cls.update_zdistance(cls, sheet)
         cls.update_prefered_value(cls, sheet)
 
+    @staticmethod
+    def update_dcoords(sheet):
+        MonolayerGeometry.update_dcoords(sheet)
+        if sheet.settings.get("boundaries") is not None:
+            update_periodic_cells(sheet)
+
     def update_prefered_value(cls, sheet):
         idx = sheet.face_df[(sheet.face_df['segment'] == 'lateral') & (sheet.face_df['num_sides'] == 3)].index
         sheet.face_df.loc[idx, 'prefered_area'] = sheet.specs['face']['prefered_area'] / 4
@@ -165,24 +269,29 @@ class ShearMonolayerGeometry(MonolayerGeometry):
         sheet.vert_df.loc[sheet.vert_df['segment'] == 'basal', 'z_barrier'] = -z_barrier
         sheet.vert_df.loc[sheet.vert_df['segment'] == 'lateral', 'z_barrier'] = z_barrier
 
-        sheet.vert_df['z_distance'] = (np.abs(sheet.vert_df["z"])
-                                       - np.abs(sheet.vert_df["z_barrier"])
-                                       ).clip(lower=0)
+        z_distance = np.empty(sheet.Nv)
+        chunked_apply(_zdistance_kernel,
+                      (sheet.vert_df["z"].to_numpy(dtype=float),
+                       sheet.vert_df["z_barrier"].to_numpy(dtype=float)),
+                      (z_distance,),
+                      **chunk_options(sheet))
+        set_columns(sheet.vert_df, ['z_distance'], z_distance)
 
     @staticmethod
     def update_gamma(cls, sheet):
-        gamma_0 = sheet.edge_df['gamma_0']
         # phi = sheet.specs['edge']['phi0']
 
-        phi = pd.to_numeric(sheet.edge_df['gamma_0']) * 0
-        phi[sheet.edge_df[sheet.edge_df['segment'] == 'apical'].index] = sheet.specs['edge']['phi0_apical']
-        phi[sheet.edge_df[sheet.edge_df['segment'] == 'basal'].index] = sheet.specs['edge']['phi0_basal']
-        phi = phi.to_numpy()
+        segment = sheet.edge_df['segment'].to_numpy()
+        phi = np.select([segment == 'apical', segment == 'basal'],
+                        [sheet.specs['edge']['phi0_apical'], sheet.specs['edge']['phi0_basal']],
+                        0.0)
+
+        if "dx" not in sheet.edge_df:
+            cls.update_dcoords(sheet)
+            cls.update_centroid(sheet)
 
-        e_angle = cls.get_phis(sheet)
-        sheet.edge_df['angle'] = e_angle
+        update_gamma_values(sheet, phi)
         # sheet.edge_df["angle"] = [np.pi + a if a < 0 else a for a in e_angle]
-        sheet.edge_df["gamma"] = gamma_0 * np.cos(2 * (e_angle - phi))
         sheet.edge_df['line_tension'] = sheet.edge_df["gamma"]
         # sheet.edge_df.loc[sheet.edge_df['segment'] == 'basal', 'line_tension'] = 0.4
         sheet.edge_df.loc[sheet.edge_df['segment'] == 'lateral', 'line_tension'] = 0.4
@@ -196,6 +305,46 @@ class ShearMonolayerGeometry(MonolayerGeometry):
         return np.arctan2(sheet.edge_df["dy"], sheet.edge_df["dx"])
 
 
+class ChunkedShearMonolayerGeometry(ShearMonolayerGeometry):
+    """Same as :class:`ShearMonolayerGeometry` with the edge, face and cell
+    geometry computed by the blocked functions of :mod:`CellPacking.chunked`,
+    in `settings['n_threads']` threads.
+
+    The results are identical to tyssue's up to floating point summation
+    order, it is faster on large tissues even with a single thread.
+    """
+
+    @staticmethod
+    def update_dcoords(sheet):
+        update_dcoords(sheet)
+        if sheet.settings.get("boundaries") is not None:
+            update_periodic_cells(sheet)
+
+    @staticmethod
+    def update_ucoords(sheet):
+        update_ucoords(sheet)
+
+    @staticmethod
+    def update_length(sheet):
+        update_length(sheet)
+
+    @staticmethod
+    def update_perimeters(sheet):
+        update_perimeters(sheet)
+
+    @staticmethod
+    def update_centroid(sheet):
+        update_bulk_centroid(sheet)
+
+    @staticmethod
+    def update_normals(sheet):
+        update_normals(sheet)
+
+    @staticmethod
+    def update_areas(sheet):
+        update_bulk_areas(sheet)
+
+
 from tyssue import PlanarGeometry
 
 
@@ -0,0 +1,270 @@
+"""
+Binary event log for topological transitions
+============================================
+
+Reconnection events (T1, I → H and H → I transitions, and the vertex
+splits that end a T1) are stored as fixed width records in an append-only binary file. Records are buffered in memory
+and written by blocks, and the whole file is read back as a single array.
+"""
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+EVENT_TYPES = {"T1": 1, "IH": 2, "HI": 3, "split": 4}
+
+event_dtype = np.dtype(
+    [
+        ("step", "<i8"),
+        ("event", "<i1"),
+        ("edge", "<i8"),
+        ("vert", "<i8"),
+        ("face", "<i8"),
+        ("cell", "<i8"),
+        ("x", "<f8"),
+        ("y", "<f8"),
+        ("z", "<f8"),
+    ]
+)
+
+
+class EventRecorder:
+    """Buffered writer of topological events.
+
+    Parameters
+    ----------
+    path : str
+        file where records are appended
+    buffer_size : int, default 4096
+        number of records kept in memory before writing to the file
+
+    Attributes
+    ----------
+    step : int
+        time step attributed to the events when it is not given explicitly,
+        set by the simulation loop
+
+    Example
+    -------
+    >>> with EventRecorder("events.bin") as recorder:
+    ...     for i in range(200):
+    ...         recorder.step = i
+    ...         ...
+    >>> events = read_events("events.bin")
+    """
+
+    def __init__(self, path, buffer_size=4096):
+        self.path = path
+        self.step = 0
+        self._buffer = np.zeros(buffer_size, dtype=event_dtype)
+        self._n = 0
+        self._file = open(path, "ab")
+
+    def record(self, event, edge=-1, vert=-1, face=-1, cell=-1,
+               position=(np.nan, np.nan, np.nan), step=None):
+        """Records a single event of type `event` (one of EVENT_TYPES keys)."""
+        if self._n == self._buffer.shape[0]:
+            self._write_buffer()
+        x, y, *z = position
+        self._buffer[self._n] = (
+            self.step if step is None else step,
+            EVENT_TYPES[event],
+            edge, vert, face, cell,
+            x, y, z[0] if z else 0.0,
+        )
+        self._n += 1
+
+    def record_edges(self, eptm, edges, event, step=None):
+        """Records one event per junction in `edges`, located at its mid point.
+
+        The half-edges joining the same pair of vertices (two in a sheet, up
+        to four in a monolayer) are recorded once, with the ids of the first one.
+        """
+        edge_df = eptm.edge_df.loc[edges]
+        pairs = np.sort(edge_df[["srce", "trgt"]].to_numpy(dtype=int), axis=1)
+        _, first = np.unique(pairs, axis=0, return_index=True)
+        edge_df = edge_df.iloc[np.sort(first)]
+        edges = edge_df.index.to_numpy()
+        if not edges.size:
+            return
+        records = np.zeros(edges.size, dtype=event_dtype)
+        records["step"] = self.step if step is None else step
+        records["event"] = EVENT_TYPES[event]
+        records["edge"] = edges
+        records["vert"] = edge_df["srce"].to_numpy()
+        records["face"] = edge_df["face"].to_numpy()
+        if "cell" in edge_df:
+            records["cell"] = edge_df["cell"].to_numpy()
+        else:
+            records["cell"] = -1
+        srce_pos = eptm.vert_df.loc[edge_df["srce"], eptm.coords].to_numpy()
+        trgt_pos = eptm.vert_df.loc[edge_df["trgt"], eptm.coords].to_numpy()
+        mid_pos = (srce_pos + trgt_pos) / 2
+        for i, c in enumerate(eptm.coords):
+            records[c] = mid_pos[:, i]
+        self.extend(records)
+
+    def extend(self, records):
+        """Appends an array of `event_dtype` records."""
+        n_records = records.shape[0]
+        if self._n + n_records > self._buffer.shape[0]:
+            self._write_buffer()
+        if n_records > self._buffer.shape[0]:
+            records.tofile(self._file)
+        else:
+            self._buffer[self._n : self._n + n_records] = records
+            self._n += n_records
+
+    def _write_buffer(self):
+        if self._n:
+            self._buffer[: self._n].tofile(self._file)
+            self._n = 0
+
+    def flush(self):
+        """Writes the buffered records to the file."""
+        self._write_buffer()
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_events(path):
+    """Reads an event file written by an :class:`EventRecorder`.
+
+    Returns
+    -------
+    events : :class:`pandas.DataFrame`
+        one row per event, the `event` column holds the event names
+    """
+    records = np.fromfile(path, dtype=event_dtype)
+    events = pd.DataFrame.from_records(records)
+    names = {code: name for name, code in EVENT_TYPES.items()}
+    events["event"] = pd.Categorical.from_codes(
+        events["event"].to_numpy() - 1, [names[code] for code in sorted(names)]
+    )
+    return events
+
+
+# temporary face column, faces are renumbered when one of them is removed
+_FACE_UID = "event_uid"
+
+
+def _edge_snapshot(eptm):
+    edge_df = eptm.edge_df
+    srce = edge_df["srce"].to_numpy(dtype=int)
+    trgt = edge_df["trgt"].to_numpy(dtype=int)
+    face = edge_df["face"].to_numpy(dtype=int)
+    vert_pos = eptm.vert_df[eptm.coords]
+    return {
+        "edge": edge_df.index.to_numpy(),
+        "srce": srce,
+        "trgt": trgt,
+        "face": face,
+        "cell": edge_df["cell"].to_numpy(dtype=int) if "cell" in edge_df else None,
+        "face_uid": eptm.face_df.loc[face, _FACE_UID].to_numpy(),
+        "coords": eptm.coords,
+        "pos": (vert_pos.loc[srce].to_numpy() + vert_pos.loc[trgt].to_numpy()) / 2,
+    }
+
+
+def _junctions(snapshot):
+    """Maps each junction between two faces or more, keyed by the sorted
+    uids of these faces, to the row of its first half-edge in `snapshot`.
+
+    The key does not depend on the vertex ids, which change when vertices
+    are merged or when the dataframes are reindexed.
+    """
+    pairs = np.sort(np.column_stack((snapshot["srce"], snapshot["trgt"])), axis=1)
+    face_uid = snapshot["face_uid"]
+    order = np.lexsort((face_uid, pairs[:, 1], pairs[:, 0]))
+    pairs, face_uid = pairs[order], face_uid[order]
+    starts = np.flatnonzero(np.r_[True, (pairs[1:] != pairs[:-1]).any(axis=1)])
+    return {
+        tuple(faces): first
+        for faces, first in zip(np.split(face_uid, starts[1:]), order[starts])
+        # a border edge is not a junction between cells
+        if faces[0] != faces[-1]
+    }
+
+
+def _snapshot_records(snapshot, rows, event, step):
+    records = np.zeros(len(rows), dtype=event_dtype)
+    records["step"] = step
+    records["event"] = EVENT_TYPES[event]
+    records["edge"] = snapshot["edge"][rows]
+    records["vert"] = snapshot["srce"][rows]
+    records["face"] = snapshot["face"][rows]
+    records["cell"] = -1 if snapshot["cell"] is None else snapshot["cell"][rows]
+    for i, c in enumerate(snapshot["coords"]):
+        records[c] = snapshot["pos"][rows, i]
+    return records
+
+
+def record_reconnect(behavior, recorder):
+    """Wraps a reconnection behavior such as `reconnect` or `reconnect_3D`
+    so that the junctions it removes and creates are recorded.
+
+    The junctions are compared before and after the behavior, so that all
+    the merges are recorded, including those of the edges shortened by a
+    previous merge, as well as the vertex splits:
+
+    * "T1": a junction between faces that no longer share an edge, with
+      its ids and mid point before the behavior,
+    * "split": a junction between faces that did not share an edge, with
+      its ids and mid point after the behavior.
+
+    A complete T1 transition is a "T1" record followed, at the same or
+    a later step, by the "split" of the junction between the new
+    neighbours.
+
+    The wrapped behavior replaces the original one when the latter
+    appends itself to the manager, so recording goes on at every time step.
+    As for the I → H and H → I transitions, the step is `recorder.step`,
+    which is kept up to date by :func:`CellPacking.simulation.simulate`.
+
+    Example
+    -------
+    >>> manager = EventManager('face')
+    >>> manager.append(record_reconnect(reconnect_3D, recorder))
+    """
+
+    def recorded(eptm, manager, **kwargs):
+        n_faces = eptm.Nf
+        eptm.face_df[_FACE_UID] = np.arange(n_faces)
+        try:
+            before = _edge_snapshot(eptm)
+            behavior(eptm, manager, **kwargs)
+            face_uid = eptm.face_df[_FACE_UID].to_numpy()
+            # a face added by the behavior is a copy of an existing one
+            _, first = np.unique(face_uid, return_index=True)
+            added = np.setdiff1d(np.arange(face_uid.size), first)
+            face_uid[added] = n_faces + np.arange(added.size)
+            eptm.face_df[_FACE_UID] = face_uid
+            after = _edge_snapshot(eptm)
+        finally:
+            eptm.face_df.drop(columns=_FACE_UID, inplace=True, errors="ignore")
+        manager.next = deque(
+            (recorded if func is behavior else func, kw) for func, kw in manager.next
+        )
+
+        unchanged = before["srce"].shape == after["srce"].shape and all(
+            (before[key] == after[key]).all() for key in ("srce", "trgt", "face_uid")
+        )
+        if unchanged:
+            return
+        old, new = _junctions(before), _junctions(after)
+        lost = [row for faces, row in old.items() if faces not in new]
+        gained = [row for faces, row in new.items() if faces not in old]
+        recorder.extend(_snapshot_records(before, lost, "T1", recorder.step))
+        recorder.extend(_snapshot_records(after, gained, "split", recorder.step))
+
+    recorded.__name__ = behavior.__name__
+    return recorded
@@ -40,6 +40,14 @@ def history_monolayer_from_sheets(apical_history, basal_history, hf5file=None):
 
 
 def monolayer_from_sheets(apical_datasets, basal_datasets, distance=1):
+    """Builds monolayer datasets from an apical and a basal sheet with the
+    same topology, separated by `distance` along z.
+
+    Periodic sheets (see :func:`CellPacking.tissuegeneration.periodic_planar_sheet`)
+    are supported: the lateral faces do not depend on the boundaries, pass the
+    sheet `settings['boundaries']` in the monolayer specs and use
+    :class:`CellPacking.dynamics.ShearMonolayerGeometry`.
+    """
     coords = list("xyz")
     datasets = {}
 
@@ -146,24 +154,35 @@ def monolayer_from_sheets(apical_datasets, basal_datasets, distance=1):
     return datasets
 
 
-def IO_transition(eptm, edge, recenter=False):
+def IO_transition(eptm, edge, recenter=False, recorder=None):
     """
     I → H transition as defined in Okuda et al. 2013
     (DOI 10.1007/s10237-012-0430-7).
     See tyssue/doc/illus/IH_transition.png for the algorithm
+
+    If `recorder` (a :class:`CellPacking.events.EventRecorder`) is given,
+    the transition is recorded at the collapsed edge position.
     """
     srce, trgt, face, cell = eptm.edge_df.loc[edge, ["srce", "trgt", "face", "cell"]]
     vert = min(srce, trgt)
+    if recorder is not None:
+        recorder.record_edges(eptm, [edge], "IH")
     collapse_edge(eptm, edge)
 
     return vert, face
 
 
-def OH_transition(eptm, vert, face, recenter=False):
+def OH_transition(eptm, vert, face, recenter=False, recorder=None):
     """
     I → H transition as defined in Okuda et al. 2013
     (DOI 10.1007/s10237-012-0430-7).
     See tyssue/doc/illus/IH_transition.png for the algorithm
+
+    If `recorder` (a :class:`CellPacking.events.EventRecorder`) is given,
+    the transition is recorded at the split vertex position.
     """
+    if recorder is not None:
+        recorder.record("HI", vert=vert, face=face,
+                        position=eptm.vert_df.loc[vert, eptm.coords].to_numpy())
     split_vert(eptm, vert, face, recenter=recenter)
     return 0
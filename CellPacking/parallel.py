@@ -0,0 +1,84 @@
+"""
+Persistent worker pool for parameter sweeps
+===========================================
+
+Each new worker process imports tyssue, pandas and the geometry stack
+before running its first task. The pool below imports them once, when
+the workers start, and is kept alive between the batches of a sweep.
+
+The workers are spawned rather than forked: a forked worker would inherit
+the thread pools of :mod:`CellPacking.chunked` without their threads.
+As with any spawned pool, the submitted functions must be importable
+(no lambdas or functions defined in a notebook cell) and scripts must
+create the pool under `if __name__ == "__main__":`.
+"""
+import importlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+WARM_MODULES = (
+    "numpy",
+    "pandas",
+    "tyssue",
+    "CellPacking.dynamics",
+    "CellPacking.tissuegeneration",
+    "CellPacking.monolayer_reforming",
+)
+
+_pool = None
+_pool_key = None
+
+
+def _import_modules(modules):
+    for module in modules:
+        importlib.import_module(module)
+    return os.getpid()
+
+
+def get_pool(n_jobs=None, modules=WARM_MODULES):
+    """Returns a process pool whose workers have already imported `modules`.
+
+    The same pool is returned as long as `n_jobs` and `modules` do not
+    change, so that sweep drivers can submit all their batches to it.
+
+    Parameters
+    ----------
+    n_jobs : int, default `os.cpu_count()`
+    modules : sequence of str
+        modules imported by each worker when it starts
+
+    Example
+    -------
+    >>> pool = get_pool(6)
+    >>> for r in repeat:
+    ...     monolayer = tissue_init(phi, noise)
+    ...     results = list(pool.map(partial(simu_process, monolayer, r), gammas))
+    """
+    global _pool, _pool_key
+    if n_jobs is None:
+        n_jobs = os.cpu_count()
+    modules = tuple(modules)
+    if _pool is not None and _pool_key == (n_jobs, modules):
+        return _pool
+
+    shutdown_pool()
+    _pool = ProcessPoolExecutor(
+        max_workers=n_jobs,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_import_modules,
+        initargs=(modules,),
+    )
+    _pool_key = (n_jobs, modules)
+    # Start the workers now rather than on the first batch
+    list(_pool.map(_import_modules, [()] * n_jobs))
+    return _pool
+
+
+def shutdown_pool():
+    """Stops the workers of the pool returned by :func:`get_pool`."""
+    global _pool, _pool_key
+    if _pool is not None:
+        _pool.shutdown()
+    _pool = None
+    _pool_key = None
@@ -1,13 +1,14 @@
 import pandas as pd
 import numpy as np
-import plotly.express as px
 
-# from tyssue.draw.plt_draw import _get_lines
-from tyssue.draw import highlight_cells
-from tyssue.draw.ipv_draw import sheet_view as sheet_view_3d
+# plotly, matplotlib and ipyvolume (through tyssue.draw) take most of the
+# import time of this module, they are imported when a figure is drawn
 
 
 def sheet_view(sheet, name_sheet=None):
+    import plotly.express as px
+    from tyssue.draw.plt_draw import _get_lines
+
     if name_sheet is None:
         name_sheet = ["sheet"]
 
@@ -30,6 +31,9 @@ def sheet_view(sheet, name_sheet=None):
 
 
 def superimpose_sheet_view(sheet1, sheet2, name_sheet=None):
+    import plotly.express as px
+    from tyssue.draw.plt_draw import _get_lines
+
     if name_sheet is None:
         name_sheet = ["sheet1", "sheet2"]
 
@@ -54,6 +58,10 @@ def superimpose_sheet_view(sheet1, sheet2, name_sheet=None):
 
 
 def view3d(mono, color='darkturquoise'):
+    import ipyvolume as ipv
+    from tyssue import config
+    from tyssue.draw.ipv_draw import sheet_view as sheet_view_3d
+
     ipv.clear()
     draw_spec = config.draw.sheet_spec()
     draw_spec['face']['visible'] = True
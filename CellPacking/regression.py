@@ -0,0 +1,269 @@
+"""
+Golden trajectories
+===================
+
+Short seeded reference simulations used to check that a faster code path
+(e.g. `settings['n_threads']`, another geometry, effector class or model
+factory) reproduces the physics.
+
+The golden trajectories of `GOLDEN_DIR` were recorded with the modules of
+the package before the threaded mode and the blocked geometry were added.
+Run `python -m CellPacking.regression` to compare the default and the
+chunked modes of the current code to them.
+
+The golden tissues have a few hundred edges, lower `min_chunk_size` in
+the settings so that they are split into several blocks in threaded mode.
+
+Example
+-------
+>>> # on the reference code
+>>> for case in CASES:
+...     save_reference(f"golden_{case}.npz", run_case(case))
+>>> # on the candidate code, or with another mode
+>>> reference = load_reference("golden_monolayer.npz")
+>>> replay(reference, geom=ChunkedShearMonolayerGeometry, **CHUNKED_MODE)
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from tyssue import EventManager, Monolayer
+from tyssue.behaviors.sheet.basic_events import reconnect
+from tyssue.config.geometry import bulk_spec
+from tyssue.dynamics import effectors
+from tyssue.dynamics.factory import model_factory
+
+from .chunked import chunked_model_factory
+from .dynamics import (AnisotropicLineTension,
+                       PlaneBarrierElasticity,
+                       ShearPlanarGeometry,
+                       ShearMonolayerGeometry,
+                       ChunkedShearMonolayerGeometry)
+from .monolayer_reforming import monolayer_from_sheets
+from .simulation import simulate
+from .tissuegeneration import symetric_circular
+
+
+def planar_case(seed):
+    """Planar disc with anisotropic line tension and reconnections."""
+    np.random.seed(seed)
+    sheet, _ = symetric_circular(4, gamma_0=0.1, phi_apical=np.pi / 2, noise=0.2)
+    sheet.settings.update({"threshold_length": 0.1, "p_4": 1, "p_5p": 1})
+    ShearPlanarGeometry.update_all(sheet)
+    model_effectors = [
+        AnisotropicLineTension,
+        effectors.FaceAreaElasticity,
+        effectors.PerimeterElasticity,
+    ]
+    return sheet, ShearPlanarGeometry, model_effectors, [reconnect]
+
+
+def monolayer_case(seed):
+    """Monolayer extruded from a planar disc, held by the plane barrier."""
+    np.random.seed(seed)
+    sheet, _ = symetric_circular(3, gamma_0=0.1, phi_apical=np.pi / 2, noise=0.2)
+    datasets = monolayer_from_sheets(sheet.datasets, sheet.datasets, distance=1)
+    specs = bulk_spec()
+    specs["settings"] = {"threshold_length": 0.1}
+    specs["edge"].update({"gamma_0": 0.1, "phi0_apical": np.pi / 2, "phi0_basal": 0.0})
+    specs["face"].update({"prefered_area": 1.0, "prefered_perimeter": 3.0})
+    specs["cell"].update({"z_barrier": 0.6})
+    monolayer = Monolayer("mono", datasets, specs)
+
+    monolayer.edge_df["gamma_0"] = 0.1
+    monolayer.face_df["prefered_area"] = 1.0
+    monolayer.face_df["prefered_perimeter"] = 3.0
+    monolayer.face_df["area_elasticity"] = 1.0
+    monolayer.face_df["perimeter_elasticity"] = 0.5
+    monolayer.vert_df["barrier_elasticity"] = 280.0
+    monolayer.edge_df["z"] = pd.to_numeric(monolayer.edge_df["z"])
+    ShearMonolayerGeometry.update_all(monolayer)
+    model_effectors = [
+        AnisotropicLineTension,
+        PlaneBarrierElasticity,
+        effectors.FaceAreaElasticity,
+        effectors.PerimeterElasticity,
+    ]
+    return monolayer, ShearMonolayerGeometry, model_effectors, []
+
+
+CASES = {"planar": planar_case, "monolayer": monolayer_case}
+
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+# threaded model and geometry, with blocks small enough for the golden tissues
+CHUNKED_MODE = {
+    "settings": {"n_threads": 4, "min_chunk_size": 64},
+    "factory": chunked_model_factory,
+}
+
+
+def run_case(case, n_steps=5, seed=0, gtol=1e-6, settings=None, geom=None,
+             model_effectors=None, factory=model_factory):
+    """Runs a seeded simulation of `case` (a key of CASES).
+
+    `settings`, `geom`, `model_effectors` and `factory` (e.g.
+    `chunked_model_factory`) replace the case defaults to run
+    an alternative mode.
+
+    Returns
+    -------
+    trajectory : dict
+        energies at each step, final vertex positions and edge topology,
+        and the run time in seconds
+    """
+    eptm, default_geom, default_effectors, behaviors = CASES[case](seed)
+    if settings is not None:
+        eptm.settings.update(settings)
+    geom = default_geom if geom is None else geom
+    model = factory(default_effectors if model_effectors is None else model_effectors)
+    manager = None
+    if behaviors:
+        manager = EventManager()
+        for behavior in behaviors:
+            manager.append(behavior)
+
+    np.random.seed(seed)
+    energies = []
+    start = time.perf_counter()
+    for view in simulate(eptm, geom, model, manager, n_steps=n_steps,
+                         options={"gtol": gtol}):
+        energies.append(view.energy)
+        pos = view.pos
+    elapsed = time.perf_counter() - start
+
+    return {
+        "case": case,
+        "n_steps": n_steps,
+        "seed": seed,
+        "gtol": gtol,
+        "energies": np.array(energies),
+        "pos": np.array(pos),
+        "topology": eptm.edge_df[["srce", "trgt", "face"]].to_numpy(dtype=int),
+        "time": elapsed,
+    }
+
+
+def save_reference(path, trajectory):
+    np.savez(path, **trajectory)
+
+
+def load_reference(path):
+    with np.load(path) as data:
+        trajectory = {key: data[key] for key in data.files}
+    for key in ("case", "n_steps", "seed", "gtol", "time"):
+        trajectory[key] = trajectory[key].item()
+    return trajectory
+
+
+def compare(reference, candidate, rtol=1e-6, atol=1e-6):
+    """Numerical deviation of `candidate` from `reference`.
+
+    Returns
+    -------
+    report : dict
+        `energy_deviation` (max relative), `pos_deviation` (max absolute,
+        inf if the number of vertices differs), `same_topology` and `passed`
+    """
+    ref_energies, energies = reference["energies"], candidate["energies"]
+    energy_deviation = np.max(
+        np.abs(energies - ref_energies) / np.maximum(np.abs(ref_energies), atol)
+    )
+    if candidate["pos"].shape == reference["pos"].shape:
+        pos_deviation = np.abs(candidate["pos"] - reference["pos"]).max()
+    else:
+        pos_deviation = np.inf
+    same_topology = (
+        candidate["topology"].shape == reference["topology"].shape
+        and (candidate["topology"] == reference["topology"]).all()
+    )
+    return {
+        "energy_deviation": energy_deviation,
+        "pos_deviation": pos_deviation,
+        "same_topology": same_topology,
+        "passed": bool(energy_deviation <= rtol and pos_deviation <= atol and same_topology),
+    }
+
+
+def replay(reference, rtol=1e-6, atol=1e-6, repeat=5, **mode):
+    """Replays the `reference` trajectory with the alternative `mode`.
+
+    The baseline (the case defaults) and the alternative mode are both run
+    here, so that the speedup is measured on the same machine, and the
+    alternative trajectory is compared to the reference. After a warm-up
+    run of each, the two are run `repeat` times in alternation and the
+    speedup is the ratio of the median run times.
+
+    Parameters
+    ----------
+    reference : dict
+        from :func:`run_case` or :func:`load_reference`
+    rtol, atol : float
+        tolerances on the energies and on the vertex positions
+    repeat : int, default 5
+        number of timed runs of each
+    mode :
+        `settings`, `geom`, `model_effectors` and/or `factory`,
+        passed to :func:`run_case`
+
+    Returns
+    -------
+    report : dict
+        :func:`compare` output with the `speedup` of the alternative mode,
+        the median `baseline_time` and `candidate_time` in seconds, and
+        their `baseline_spread` and `candidate_spread`, (max - min) / median
+    """
+    params = {key: reference[key] for key in ("n_steps", "seed", "gtol")}
+    run_case(reference["case"], **params)
+    candidate = run_case(reference["case"], **params, **mode)
+    baseline_times, candidate_times = [], []
+    for _ in range(repeat):
+        baseline_times.append(run_case(reference["case"], **params)["time"])
+        candidate_times.append(run_case(reference["case"], **params, **mode)["time"])
+
+    report = compare(reference, candidate, rtol=rtol, atol=atol)
+    for name, times in (("baseline", baseline_times), ("candidate", candidate_times)):
+        median = np.median(times)
+        report[f"{name}_time"] = median
+        report[f"{name}_spread"] = (np.max(times) - np.min(times)) / median
+    report["speedup"] = report["baseline_time"] / report["candidate_time"]
+    report["case"] = reference["case"]
+    return report
+
+
+def check_golden(rtol=1e-6, atol=1e-6, repeat=3, golden_dir=GOLDEN_DIR):
+    """Compares the current code to the golden trajectories of `golden_dir`.
+
+    For each case, the default mode is compared to the golden trajectory,
+    then the chunked mode is replayed (see :func:`replay`), with
+    `ChunkedShearMonolayerGeometry` for the monolayer.
+
+    Returns
+    -------
+    reports : list of dict
+        :func:`compare` outputs with `case` and `mode` entries
+    """
+    reports = []
+    for case in CASES:
+        reference = load_reference(os.path.join(golden_dir, f"golden_{case}.npz"))
+        params = {key: reference[key] for key in ("n_steps", "seed", "gtol")}
+        report = compare(reference, run_case(case, **params), rtol=rtol, atol=atol)
+        report.update(case=case, mode="default")
+        reports.append(report)
+
+        mode = dict(CHUNKED_MODE)
+        if case == "monolayer":
+            mode["geom"] = ChunkedShearMonolayerGeometry
+        report = replay(reference, rtol=rtol, atol=atol, repeat=repeat, **mode)
+        report["mode"] = "chunked"
+        reports.append(report)
+    return reports
+
+
+if __name__ == "__main__":
+    reports = check_golden()
+    for report in reports:
+        print(", ".join(f"{key}: {value}" for key, value in report.items()))
+    sys.exit(0 if all(report["passed"] for report in reports) else 1)
@@ -0,0 +1,238 @@
+"""
+Coarse-to-fine relaxation
+=========================
+
+Initial relaxation of the tissues: loose tolerance while the topology
+is still changing, tight tolerance once it is stable, then extrusion of
+the converged planar sheet into a monolayer.
+"""
+import copy
+import logging
+
+import numpy as np
+import pandas as pd
+from tyssue import Monolayer
+from tyssue.config.geometry import bulk_spec
+from tyssue.geometry.planar_geometry import PlanarGeometry
+from tyssue.solvers import QSSolver
+
+from .dynamics import ShearMonolayerGeometry
+from .monolayer_reforming import monolayer_from_sheets
+
+log = logging.getLogger(__name__)
+
+GTOLS = (1e-4, 1e-6, 1e-8)
+
+
+def _topology(eptm):
+    return eptm.edge_df[["srce", "trgt", "face"]].to_numpy().copy()
+
+
+def staged_relaxation(eptm, geom, model, manager=None, gtols=GTOLS, patience=3,
+                      min_steps=50, max_steps=100, noise=1e-3, solver=None,
+                      periodic=False, rng=None):
+    """Minimizes the energy of `eptm` with a tolerance tightened each time
+    the topology stops changing.
+
+    At each step, the manager events (e.g. `reconnect`) are executed, the
+    energy is minimized with the current `gtol`, and a small noise is
+    added before the next step. The tolerance goes to the next
+    value of `gtols` after `patience` consecutive steps without topology
+    change. The tissue is converged after `patience` such steps at the
+    last tolerance (and at least `min_steps` steps), the relaxation then
+    stops. The tissue is left at the last energy minimum.
+
+    Noise keeps triggering a few rearrangements long after the topology
+    looks stable, which keep lowering the energy. The default `min_steps`
+    explores as long as the 50 steps of the notebook protocol, so that
+    only the first minimizations are faster and the final statistics do
+    not change. A lower `min_steps` stops as soon as the topology is
+    stable, in fewer steps but in a slightly higher energy state.
+
+    Parameters
+    ----------
+    eptm : :class:`tyssue.Epithelium`
+    geom : geometry class
+    model : model class from `model_factory`
+    manager : :class:`tyssue.EventManager`, optional
+    gtols : sequence of float, default (1e-4, 1e-6, 1e-8)
+        decreasing tolerances, the last one is the final precision
+    patience : int, default 3
+        number of consecutive steps without topology change
+        before tightening the tolerance
+    min_steps : int, default 50
+        minimum number of minimizations
+    max_steps : int, default 100
+        maximum number of minimizations
+    noise : float, default 1e-3
+        standard deviation of the noise added to the x and y coordinates
+        between two steps
+    solver : default `QSSolver` without t1, t3 and collisions
+    periodic : bool, default False
+        passed to `find_energy_min`
+    rng : random generator with a `normal` method, default `np.random`
+
+    Returns
+    -------
+    res : :class:`scipy.optimize.OptimizeResult`
+        result of the last minimization
+    n_steps : int
+        number of minimizations performed
+    converged : bool
+        False if `max_steps` was reached before convergence
+    """
+    if solver is None:
+        solver = QSSolver(with_t1=False, with_t3=False, with_collisions=False)
+    if rng is None:
+        rng = np.random
+
+    stage = 0
+    stable_steps = 0
+    res = None
+    for i in range(max_steps):
+        if i:
+            eptm.vert_df[["x", "y"]] += rng.normal(scale=noise, size=(eptm.Nv, 2))
+            geom.update_all(eptm)
+        topology = _topology(eptm)
+        if manager is not None:
+            manager.execute(eptm)
+            manager.update()
+
+        res = solver.find_energy_min(eptm, geom, model, periodic=periodic,
+                                     options={"gtol": gtols[stage]})
+        if not res.success:
+            log.info("step %i, gtol %g: %s", i, gtols[stage], res.message)
+
+        new_topology = _topology(eptm)
+        if topology.shape == new_topology.shape and (topology == new_topology).all():
+            stable_steps += 1
+        else:
+            stable_steps = 0
+        if stable_steps >= patience:
+            if stage < len(gtols) - 1:
+                stage += 1
+                stable_steps = 0
+            elif i + 1 >= min_steps:
+                return res, i + 1, True
+
+    return res, max_steps, False
+
+
+# specs read by ShearMonolayerGeometry.update_all
+REQUIRED_SPECS = {
+    "edge": ("gamma_0", "phi0_apical", "phi0_basal"),
+    "face": ("prefered_area", "prefered_perimeter"),
+    "cell": ("z_barrier",),
+}
+
+
+def monolayer_specs(sheet, distance=1):
+    """Default specs of the monolayer extruded from `sheet`.
+
+    `bulk_spec()` completed with the sheet line tension specs (`gamma_0`,
+    `phi0_apical` and `phi0_basal`), the mean prefered area and perimeter
+    of its faces, a barrier at 0.55 * `distance` from the mid plane, just
+    outside the apical and basal sheets as in the simulation notebooks,
+    and a copy of the sheet periodic boundaries, if any.
+    """
+    specs = bulk_spec()
+    for key in REQUIRED_SPECS["edge"]:
+        if key in sheet.specs["edge"]:
+            specs["edge"][key] = sheet.specs["edge"][key]
+    for key in REQUIRED_SPECS["face"]:
+        if key in sheet.specs["face"]:
+            specs["face"][key] = sheet.specs["face"][key]
+        elif key in sheet.face_df:
+            specs["face"][key] = float(sheet.face_df[key].mean())
+    specs["cell"]["z_barrier"] = 0.55 * distance
+    if sheet.settings.get("boundaries") is not None:
+        specs["settings"]["boundaries"] = copy.deepcopy(sheet.settings["boundaries"])
+    return specs
+
+
+def relax_and_extrude(sheet, planar_model, monolayer_model, planar_manager=None,
+                      monolayer_manager=None, specs=None, distance=1, setup=None,
+                      planar_geom=PlanarGeometry, planar_steps=50, monolayer_steps=10,
+                      **relax_kw):
+    """Relaxes a planar sheet, extrudes it into a monolayer once converged,
+    and relaxes the monolayer.
+
+    Parameters
+    ----------
+    sheet : :class:`tyssue.Sheet`
+        planar sheet, e.g. from `symetric_circular`
+    planar_model, monolayer_model : model classes
+    planar_manager, monolayer_manager : :class:`tyssue.EventManager`, optional
+        e.g. with `reconnect` and `reconnect_3D` respectively
+    specs : dict, optional
+        monolayer specs, they update the defaults of :func:`monolayer_specs`,
+        which update the `monolayer_model` specs
+    distance : float, default 1
+        distance between the apical and basal sheets
+    setup : function, optional
+        called on the monolayer after the extrusion and before its
+        relaxation, e.g. to set its mechanical parameters
+    planar_geom : geometry class, default `PlanarGeometry`
+        use `ShearPlanarGeometry` if `planar_model` has an
+        `AnisotropicLineTension` effector
+    planar_steps, monolayer_steps : int, default 50 and 10
+        `min_steps` of the planar and monolayer relaxations, the number
+        of steps of the notebook protocol, lower them for a faster but
+        less explored equilibrium
+    relax_kw :
+        passed to :func:`staged_relaxation`
+
+    Returns
+    -------
+    monolayer : :class:`tyssue.Monolayer`
+    converged : bool
+        False if the monolayer did not converge within `max_steps`
+
+    Raises
+    ------
+    ValueError
+        if specs read by `ShearMonolayerGeometry` are missing, see
+        `REQUIRED_SPECS`, this is checked before any relaxation
+    RuntimeError
+        if the planar sheet did not converge within `max_steps`
+    """
+    monolayer_spec = copy.deepcopy(getattr(monolayer_model, "specs", {}))
+    for update in (monolayer_specs(sheet, distance), specs or {}):
+        for element, values in update.items():
+            monolayer_spec.setdefault(element, {}).update(copy.deepcopy(values))
+    missing = [
+        f"{element}.{key}"
+        for element, keys in REQUIRED_SPECS.items()
+        for key in keys
+        if key not in monolayer_spec.get(element, {})
+    ]
+    if missing:
+        raise ValueError(f"Missing monolayer specs: {', '.join(missing)}")
+
+    _, n_steps, converged = staged_relaxation(sheet, planar_geom, planar_model,
+                                              planar_manager, min_steps=planar_steps,
+                                              **relax_kw)
+    if not converged:
+        raise RuntimeError(
+            f"The planar sheet did not converge in {n_steps} steps, "
+            "increase max_steps before extruding it"
+        )
+
+    datasets = monolayer_from_sheets(sheet.datasets, sheet.datasets, distance=distance)
+    monolayer = Monolayer("mono", datasets, monolayer_spec)
+    # the lateral faces and edges have no value for the sheet columns
+    for element in ("edge", "face"):
+        df = monolayer.datasets[element]
+        for key in REQUIRED_SPECS[element]:
+            if key in df:
+                df[key] = pd.to_numeric(df[key]).fillna(monolayer_spec[element][key])
+    if setup is not None:
+        setup(monolayer)
+    ShearMonolayerGeometry.update_all(monolayer)
+
+    _, n_steps, converged = staged_relaxation(monolayer, ShearMonolayerGeometry,
+                                              monolayer_model, monolayer_manager,
+                                              min_steps=monolayer_steps, **relax_kw)
+    if not converged:
+        log.info("the monolayer did not converge in %i steps", n_steps)
+    return monolayer, converged
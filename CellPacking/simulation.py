@@ -0,0 +1,100 @@
+"""
+Streaming quasistatic simulation
+================================
+
+The simulation loop of the notebooks (events, energy minimization,
+noise kick) as a generator. Nothing is written to disk, each step is
+yielded as a light read-only view and the consumer decides what to keep.
+"""
+from collections import namedtuple
+
+import numpy as np
+from tyssue.solvers import QSSolver
+
+StepView = namedtuple("StepView", ["step", "pos", "energy", "res", "events", "boundaries"])
+StepView.__doc__ = """Read-only view of a simulation step
+
+Attributes
+----------
+step : int
+pos : (Nv, dim) read-only array
+    positions of the active vertices at the energy minimum, this is a view
+    on the solver result, not a copy of `vert_df`
+energy : float
+res : :class:`scipy.optimize.OptimizeResult`
+    solver information
+events : tuple
+    (behavior name, kwargs) pairs executed by the manager at this step
+boundaries : dict or None
+    periodic boundaries (`{coord: [low, high]}`) at the energy minimum,
+    the box size is optimized together with the positions when `periodic`
+    is True, None otherwise
+"""
+
+
+def simulate(eptm, geom, model, manager=None, solver=None, n_steps=200,
+             noise=1e-3, recorder=None, periodic=False, rng=None, **minimize_kw):
+    """Runs the quasistatic simulation and yields a :class:`StepView` per step.
+
+    At each step the manager events are executed, the energy is minimized and,
+    once the step has been consumed, the vertices are displaced by a gaussian
+    noise. `eptm` is modified in place, copy it beforehand to keep
+    the initial state.
+
+    Parameters
+    ----------
+    eptm : :class:`tyssue.Epithelium`
+    geom : geometry class, e.g. :class:`ShearMonolayerGeometry`
+    model : model class from `model_factory`
+    manager : :class:`tyssue.EventManager`, optional
+    solver : default `QSSolver` without t1, t3 and collisions
+    n_steps : int, default 200
+    noise : float, default 1e-3
+        standard deviation of the noise added to the x and y coordinates
+        between two steps
+    recorder : :class:`CellPacking.events.EventRecorder`, optional
+        its `step` is kept in sync with the simulation
+    periodic : bool, default False
+        passed to `find_energy_min`
+    rng : random generator with a `normal` method, default `np.random`
+    minimize_kw :
+        passed to `find_energy_min`, default `options={"gtol": 1e-8}`
+
+    Example
+    -------
+    >>> for view in simulate(monolayer, ShearMonolayerGeometry, model, manager):
+    ...     energies.append(view.energy)
+    ...     if view.step % 10 == 0:
+    ...         save_datasets(f"monolayer{view.step}.hf5", monolayer)
+    """
+    if solver is None:
+        solver = QSSolver(with_t1=False, with_t3=False, with_collisions=False)
+    if rng is None:
+        rng = np.random
+    if not minimize_kw:
+        minimize_kw = {"options": {"gtol": 1e-8}}
+
+    for i in range(n_steps):
+        if recorder is not None:
+            recorder.step = i
+        events = ()
+        if manager is not None:
+            events = tuple((behavior.__name__, kwargs)
+                           for behavior, kwargs in manager.current)
+            manager.execute(eptm)
+
+        res = solver.find_energy_min(eptm, geom, model, periodic=periodic, **minimize_kw)
+        boundaries = None
+        if periodic:
+            # the solver appends the box size to the positions
+            pos = res.x[:-1].reshape((-1, eptm.dim))
+            boundaries = {u: list(b) for u, b in eptm.settings["boundaries"].items()}
+        else:
+            pos = res.x.reshape((-1, eptm.dim))
+        pos.flags.writeable = False
+        yield StepView(i, pos, res.fun, res, events, boundaries)
+
+        eptm.vert_df[["x", "y"]] += rng.normal(scale=noise, size=(eptm.Nv, 2))
+        geom.update_all(eptm)
+        if manager is not None:
+            manager.update()
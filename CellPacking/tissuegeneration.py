@@ -1,14 +1,116 @@
 import numpy as np
 import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import Voronoi, cKDTree
 
 from tyssue import Sheet
 # from tyssue import PlanarGeometry as geom
 from .dynamics import ShearPlanarGeometry as geom
 from tyssue.geometry.planar_geometry import PlanarGeometry
-from tyssue.generation import config, AnnularSheet
+from tyssue.generation import config, AnnularSheet, from_2d_voronoi, hexa_grid2d
 
 
-def sheet_init(nx, ny, gamma_0=0.5, phi=np.pi / 2, noise=0.2):
+def periodic_planar_sheet(nx, ny, distx=1, disty=1, noise=0.2, tol=1e-6):
+    """Generates a planar sheet of nx * ny cells with periodic boundary
+    conditions along x and y.
+
+    The Voronoi tessellation of the hexagonal grid is computed with its 8
+    periodic images, the cells of the central copy are kept and their
+    vertices identified modulo the box size.
+
+    Parameters
+    ----------
+    nx, ny : int
+        number of cells along x and y, ny must be even for the
+        hexagonal grid to be periodic, and both should be larger than 2
+    distx, disty : float
+        distance between cell centers
+    noise : float
+        standard deviation of the noise on the cell centers
+    tol : float
+        distance under which two vertex images are merged
+
+    Returns
+    -------
+    sheet : :class:`Sheet`
+        with the periodic box stored in `sheet.settings['boundaries']`,
+        centered on (0, 0)
+    """
+    if ny % 2:
+        raise ValueError(f"ny should be even to get a periodic grid, got {ny}")
+
+    size = np.array([nx * distx, ny * disty], dtype=float)
+    centers = np.mod(hexa_grid2d(nx, ny, distx, disty, noise), size)
+    n_faces = centers.shape[0]
+    shifts = [(i, j) for j in (-1, 0, 1) for i in (-1, 0, 1)]
+    points = np.concatenate([centers + np.array(shift) * size for shift in shifts])
+    datasets = from_2d_voronoi(Voronoi(points))
+
+    # central copy, at shift (0, 0)
+    first_face = shifts.index((0, 0)) * n_faces
+    edge_df = datasets["edge"]
+    edge_df = edge_df[
+        (edge_df["face"] >= first_face) & (edge_df["face"] < first_face + n_faces)
+    ].copy()
+    edge_df["face"] -= first_face
+
+    # identify vertices modulo the box size
+    verts = np.unique(edge_df[["srce", "trgt"]].to_numpy())
+    pos = np.mod(datasets["vert"].loc[verts, ["x", "y"]].to_numpy(), size)
+    pos = np.where(pos >= size, pos - size, pos)
+    pairs = cKDTree(pos, boxsize=size).query_pairs(tol, output_type="ndarray")
+    graph = coo_matrix(
+        (np.ones(pairs.shape[0]), (pairs[:, 0], pairs[:, 1])),
+        shape=(verts.size, verts.size),
+    )
+    _, labels = connected_components(graph, directed=False)
+    new_vert = pd.Series(labels, index=verts)
+    edge_df["srce"] = new_vert.loc[edge_df["srce"]].to_numpy()
+    edge_df["trgt"] = new_vert.loc[edge_df["trgt"]].to_numpy()
+    # degenerated Voronoi vertices give null length edges
+    edge_df = edge_df[edge_df["srce"] != edge_df["trgt"]]
+    edge_df.index = pd.Index(range(edge_df.shape[0]), name="edge")
+
+    vert_df = datasets["vert"].iloc[: labels.max() + 1].copy()
+    vert_df.index = pd.Index(range(vert_df.shape[0]), name="vert")
+    _, first = np.unique(labels, return_index=True)
+    vert_df[["x", "y"]] = pos[first] - size / 2
+
+    face_df = datasets["face"].iloc[first_face: first_face + n_faces].copy()
+    face_df.index = pd.Index(range(n_faces), name="face")
+    face_df[["x", "y"]] = centers - size / 2
+
+    specs = config.geometry.planar_spec()
+    specs["settings"] = specs.get("settings", {})
+    specs["settings"]["boundaries"] = {
+        "x": [-size[0] / 2, size[0] / 2],
+        "y": [-size[1] / 2, size[1] / 2],
+    }
+    sheet = Sheet(
+        "periodic", {"vert": vert_df, "edge": edge_df, "face": face_df}, specs,
+        coords=["x", "y"],
+    )
+    sheet.reset_topo()
+    return sheet
+
+
+def sheet_init(nx, ny, gamma_0=0.5, phi=np.pi / 2, noise=0.2, periodic=False):
+    """Generates a planar sheet of about nx * ny cells centered on (0, 0).
+
+    If `periodic` is True, the sheet has periodic boundary conditions
+    (see :func:`periodic_planar_sheet`) instead of free borders, so that
+    all cells belong to the bulk.
+    """
+    if periodic:
+        sheet = periodic_planar_sheet(nx, ny, distx=1, disty=1, noise=noise)
+        sheet.update_specs({"edge": {"gamma_0": gamma_0,
+                                     "phi0": phi},
+                            })
+        PlanarGeometry.update_all(sheet)
+        sheet.edge_df["opposite"] = sheet.get_opposite()
+        return sheet, PlanarGeometry
+
     sheet = Sheet.planar_sheet_2d(
         'sheet', nx=nx, ny=ny, distx=1, disty=1, noise=noise)
 
@@ -26,23 +128,27 @@ def sheet_init(nx, ny, gamma_0=0.5, phi=np.pi / 2, noise=0.2):
 
     # Center sheet to (0,0)
     PlanarGeometry.center(sheet)
-
-    # Add specs for periodic boundary condition
-    # sheet.update_specs(
-    #     {'settings': {
-    #         'boundaries': {'x': [-nx / 2 - 1, nx / 2 + 1],
-    #                        'y': [-ny / 2 - 1, ny / 2 + 1]}
-    #     }})
     PlanarGeometry.update_all(sheet)
     sheet.edge_df["opposite"] = sheet.get_opposite()
     return sheet, PlanarGeometry
 
 
-def symetric_circular(radius, gamma_0=0.5, phi_apical=np.pi / 2, phi_basal=0, noise=0.0):
-    ncells = radius * 3
-    sheet = Sheet.planar_sheet_2d(
-        "planar", nx=ncells, ny=ncells, distx=1, disty=1, noise=noise,
-    )
+def symetric_circular(radius, gamma_0=0.5, phi_apical=np.pi / 2, phi_basal=0, noise=0.0,
+                      periodic=False):
+    """Generates a disc of cells of radius `radius`, centered on a cell,
+    whose border edges have a high line tension to limit border effects.
+
+    If `periodic` is True, a square periodic sheet of side 2 * radius
+    is generated instead, there is no border and the returned
+    `border_edges` index is empty.
+    """
+    if periodic:
+        sheet = periodic_planar_sheet(2 * radius, 2 * radius, distx=1, disty=1, noise=noise)
+    else:
+        ncells = radius * 3
+        sheet = Sheet.planar_sheet_2d(
+            "planar", nx=ncells, ny=ncells, distx=1, disty=1, noise=noise,
+        )
 
     sheet.specs['settings']['dt'] = 0.01
 
@@ -64,6 +170,11 @@ def symetric_circular(radius, gamma_0=0.5, phi_apical=np.pi / 2, phi_basal=0, no
     sheet.edge_df.loc[sheet.edge_df.opposite == -1, 'line_tension'] = 5.0
 
     geom.update_all(sheet)
+    if periodic:
+        # Cells already have a unit mean area and the box is centered
+        sheet.edge_df["opposite"] = sheet.get_opposite()
+        border_edges = sheet.edge_df[sheet.edge_df["opposite"] == -1].index
+        return sheet, border_edges
 
     geom.scale(sheet, sheet.face_df.area.median() ** (-0.5), sheet.coords)
     geom.center(sheet)